@@ -1,53 +1,185 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
 import plotly.graph_objects as go
+import hashlib
+import hmac
 import json
 import os
+import sqlite3
+from collections import Counter
+from pybloom_live import ScalableBloomFilter
 
 # File paths for storing data
-VOTES_FILE = "votes.csv"
-VOTERS_FILE = "voters.txt"
+DB_FILE = "poll.db"
+LEGACY_VOTES_LOG = "votes.log"
+LEGACY_VOTES_CSV = "votes.csv"
+LEGACY_VOTERS_FILE = "voters.txt"
 ADMIN_PASSWORD = "your_admin_password_here"  # Change this to your desired password
 
-# Function to load votes from CSV
-def load_votes():
-    if os.path.exists(VOTES_FILE):
-        df = pd.read_csv(VOTES_FILE)
-        return df.set_index('option')['votes'].to_dict()
-    return {
-        'Baddieverse.ai': 0,
-        'Snapslay.ai': 0,
-        'Photodrip.ai': 0,
-        'photodripai.com': 0,
-        'Baddiegen.ai': 0,
-        'Slaymode.ai': 0,
-        'SnapPersona.ai': 0,
-        'PicPersona.ai': 0,
-        'ProfilePop.ai': 0,
-        'personalabai.com': 0,
-        'None of these': 0  # Added new option
-    }
-
-# Function to save votes to CSV
-def save_votes(votes):
-    df = pd.DataFrame(list(votes.items()), columns=['option', 'votes'])
-    df.to_csv(VOTES_FILE, index=False)
-
-# Function to load voters
-def load_voters():
-    if os.path.exists(VOTERS_FILE):
-        with open(VOTERS_FILE, 'r') as f:
-            return set(f.read().splitlines())
+ADMIN_ITERATIONS = 100_000
+
+def hash_password(password, salt):
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, ADMIN_ITERATIONS)
+
+# Admin password salt and digest, built once per process rather than per rerun;
+# the password is an argument so editing ADMIN_PASSWORD changes the cache key
+@st.cache_resource
+def admin_digest(password):
+    salt = os.urandom(16)
+    return salt, hash_password(password, salt)
+
+# Poll options, in the order shown on the ballot and in the results
+OPTIONS = [
+    'Baddieverse.ai',
+    'Snapslay.ai',
+    'Photodrip.ai',
+    'photodripai.com',
+    'Baddiegen.ai',
+    'Slaymode.ai',
+    'SnapPersona.ai',
+    'PicPersona.ai',
+    'ProfilePop.ai',
+    'personalabai.com',
+    'None of these'  # Added new option
+]
+
+# Function to read vote totals from the flat-file stores used before sqlite
+def read_legacy_votes():
+    counts = Counter()
+    if os.path.exists(LEGACY_VOTES_LOG):
+        with open(LEGACY_VOTES_LOG, 'r') as f:
+            for line in f:
+                entry = json.loads(line)
+                counts[entry['option']] += entry['votes']
+    elif os.path.exists(LEGACY_VOTES_CSV):
+        df = pd.read_csv(LEGACY_VOTES_CSV)
+        for option, votes in zip(df['option'], df['votes']):
+            counts[option] += int(votes)
+    return counts
+
+# Function to read voter names from the flat-file store used before sqlite
+def read_legacy_voters():
+    if os.path.exists(LEGACY_VOTERS_FILE):
+        with open(LEGACY_VOTERS_FILE, 'r') as f:
+            return {name for name in f.read().splitlines() if name}
     return set()
 
-# Function to save voters
-def save_voters(voters):
-    with open(VOTERS_FILE, 'w') as f:
-        f.write('\n'.join(voters))
+# Function to create the tables on first use, importing any legacy data;
+# runs once per process
+@st.cache_resource
+def init_db():
+    conn = sqlite3.connect(DB_FILE, isolation_level=None)
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('BEGIN IMMEDIATE')
+        new_db = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'voters'"
+        ).fetchone() is None
+        conn.execute('CREATE TABLE IF NOT EXISTS votes(option TEXT PRIMARY KEY, n INTEGER)')
+        conn.execute('CREATE TABLE IF NOT EXISTS voters(name TEXT PRIMARY KEY)')
+        conn.executemany('INSERT OR IGNORE INTO votes VALUES(?, 0)',
+                         [(option,) for option in OPTIONS])
+        if new_db:
+            counts = read_legacy_votes()
+            conn.executemany('INSERT OR IGNORE INTO votes VALUES(?, 0)',
+                             [(option,) for option in counts])
+            conn.executemany('UPDATE votes SET n = ? WHERE option = ?',
+                             [(n, option) for option, n in counts.items()])
+            conn.executemany('INSERT OR IGNORE INTO voters VALUES(?)',
+                             [(name,) for name in read_legacy_voters()])
+        conn.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+# Function to open the poll database; each session keeps one connection,
+# and its reruns may run on different threads but never concurrently
+def get_connection():
+    init_db()
+    return sqlite3.connect(DB_FILE, isolation_level=None, check_same_thread=False)
+
+if 'conn' not in st.session_state:
+    st.session_state.conn = get_connection()
+conn = st.session_state.conn
+
+# Modification time of the database, used to key the load caches
+def db_mtime():
+    return max(os.path.getmtime(path) for path in (DB_FILE, DB_FILE + '-wal')
+               if os.path.exists(path))
+
+# Function to load votes; the result is shared across sessions, so copy before mutating
+@st.cache_resource
+def load_votes(mtime):
+    return dict(conn.execute('SELECT option, n FROM votes ORDER BY rowid'))
+
+# Function to load voters; the result is shared across sessions, so copy before mutating
+@st.cache_resource
+def load_voters(mtime):
+    return {name for (name,) in conn.execute('SELECT name FROM voters')}
+
+# Sorted voter names for display, shared across sessions
+@st.cache_resource
+def sorted_voters(mtime):
+    return sorted(load_voters(mtime))
+
+# Bloom filter of voter names for the "already voted" check; built once per
+# process and extended on each vote, rebuilt only after voters are deleted
+@st.cache_resource
+def get_voter_bloom():
+    bloom = ScalableBloomFilter(initial_capacity=10_000, error_rate=0.001)
+    for name in load_voters(db_mtime()):
+        bloom.add(name)
+    return bloom
+
+# Function to check whether a name has voted; the database confirms bloom hits
+def has_voted(name):
+    if name not in get_voter_bloom():
+        return False
+    return conn.execute('SELECT 1 FROM voters WHERE name = ?', (name,)).fetchone() is not None
+
+# Function to drop the cached votes and voters after a write
+def clear_cache():
+    load_votes.clear()
+    load_voters.clear()
+    sorted_voters.clear()
+
+# Function to record a vote; returns False if the name has already voted
+def record_vote(name, option):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        inserted = conn.execute('INSERT OR IGNORE INTO voters VALUES(?)', (name,)).rowcount
+        if inserted:
+            conn.execute('UPDATE votes SET n = n + 1 WHERE option = ?', (option,))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    get_voter_bloom().add(name)
+    clear_cache()
+    return bool(inserted)
+
+# Function to reset all votes and voters
+def delete_all_votes():
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM voters')
+        conn.execute('UPDATE votes SET n = 0')
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    get_voter_bloom.clear()
+    clear_cache()
+
+# Function to delete a single voter
+def delete_voter(name):
+    conn.execute('DELETE FROM voters WHERE name = ?', (name,))
+    get_voter_bloom.clear()
+    clear_cache()
 
 # Initialize session state
 if 'name_submitted' not in st.session_state:
@@ -56,10 +188,6 @@ if 'current_name' not in st.session_state:
     st.session_state.current_name = ''
 if 'show_results' not in st.session_state:
     st.session_state.show_results = False
-if 'votes' not in st.session_state:
-    st.session_state.votes = load_votes()
-if 'voters' not in st.session_state:
-    st.session_state.voters = load_voters()
 if 'show_admin' not in st.session_state:
     st.session_state.show_admin = False
 
@@ -71,17 +199,14 @@ name = st.text_input('Enter your name:')
 
 # Check if user has already voted
 if name:
-    if name in st.session_state.voters:
+    if has_voted(name):
         st.warning('You have already voted!')
         st.session_state.show_results = True
     else:
         # Create the voting interface with new option
         vote = st.radio(
             'Which name do you prefer?',
-            ['Baddieverse.ai', 'Snapslay.ai', 'Photodrip.ai', 
-             'photodripai.com', 'Baddiegen.ai', 'Slaymode.ai',
-             'None of these','SnapPersona.ai','PicPersona.ai', 
-             'ProfilePop.ai', 'personalabai.com']  # Added new option
+            OPTIONS
         )
         
         # Show text input if "None of these" is selected
@@ -90,17 +215,15 @@ if name:
         
         if st.button('Submit Vote'):
             # Record the vote
-            st.session_state.votes[vote] += 1
-            st.session_state.voters.add(name)
-            
-            # Save to files
-            save_votes(st.session_state.votes)
-            save_voters(st.session_state.voters)
+            recorded = record_vote(name, vote)
             
-            success_message = 'Thank you for voting!'
-            if vote == 'None of these' and suggestion:
-                success_message += f' Your suggestion "{suggestion}" has been noted.'
-            st.success(success_message)
+            if recorded:
+                success_message = 'Thank you for voting!'
+                if vote == 'None of these' and suggestion:
+                    success_message += f' Your suggestion "{suggestion}" has been noted.'
+                st.success(success_message)
+            else:
+                st.warning('You have already voted!')
             st.session_state.show_results = True
 
 # Add a button to toggle results visibility
@@ -112,10 +235,13 @@ if st.session_state.show_results:
     st.header('Current Results')
     
     # Create a bar chart using plotly
+    votes = load_votes(db_mtime())
+    options = tuple(votes)
+    counts = np.fromiter(votes.values(), dtype=np.int32)
     fig = go.Figure(data=[
         go.Bar(
-            x=list(st.session_state.votes.keys()),
-            y=list(st.session_state.votes.values()),
+            x=options,
+            y=counts,
             marker_color='rgb(158,202,225)',
             marker_line_color='rgb(8,48,107)',
             marker_line_width=1.5,
@@ -135,36 +261,36 @@ if st.session_state.show_results:
         showlegend=False
     )
     
-    st.plotly_chart(fig)
+    # Results are read-only, so skip Plotly's hover/zoom handlers
+    st.plotly_chart(fig, use_container_width=True,
+                    config={'staticPlot': True, 'displayModeBar': False})
     
     # Calculate and display percentages
-    total_votes = sum(st.session_state.votes.values())
+    total_votes = counts.sum()
     if total_votes > 0:
         st.subheader('Vote Distribution')
-        cols = st.columns(2)
-        for idx, (name, votes) in enumerate(st.session_state.votes.items()):
-            percentage = (votes / total_votes) * 100
-            col_idx = idx % 2
-            with cols[col_idx]:
-                st.metric(
-                    label=name,
-                    value=f"{votes} votes",
-                    delta=f"{percentage:.1f}%"
-                )
+        results = pd.DataFrame({
+            'option': options,
+            'votes': counts,
+            'pct': counts * 100 / total_votes
+        })
+        st.dataframe(results.style.format({'pct': '{:.1f}%'}), hide_index=True)
     
     # Show who has voted
     st.subheader('Voters:')
-    if st.session_state.voters:
-        st.write(', '.join(sorted(st.session_state.voters)))
+    voters = sorted_voters(db_mtime())
+    if voters:
+        st.text(', '.join(voters))
     else:
-        st.write('No votes yet!')
+        st.text('No votes yet!')
 
 # Admin Section at bottom
 st.markdown("---")  # Add a divider
 with st.expander("Admin Access"):
     admin_password = st.text_input("Enter admin password:", type="password", key="admin_password")
     if st.button("Login as Admin"):
-        if admin_password == ADMIN_PASSWORD:
+        salt, admin_hash = admin_digest(ADMIN_PASSWORD)
+        if hmac.compare_digest(admin_hash, hash_password(admin_password, salt)):
             st.session_state.show_admin = True
             st.success("Admin access granted!")
         else:
@@ -178,18 +304,15 @@ with st.expander("Admin Access"):
         
         with col1:
             if st.button("Delete All Votes"):
-                st.session_state.votes = {key: 0 for key in st.session_state.votes}
-                st.session_state.voters = set()
-                save_votes(st.session_state.votes)
-                save_voters(st.session_state.voters)
+                delete_all_votes()
                 st.success("All votes have been deleted!")
         
         with col2:
             # Delete individual voter
+            voters = sorted_voters(db_mtime())
             voter_to_delete = st.selectbox("Select voter to delete:", 
-                                         options=sorted(list(st.session_state.voters)) if st.session_state.voters else ['No voters'])
+                                         options=voters if voters else ['No voters'])
             if st.button("Delete Selected Voter"):
-                if voter_to_delete in st.session_state.voters:
-                    st.session_state.voters.remove(voter_to_delete)
-                    save_voters(st.session_state.voters)
+                if voter_to_delete in voters:
+                    delete_voter(voter_to_delete)
                     st.success(f"Voter '{voter_to_delete}' has been deleted!")
@@ -1,10 +1,41 @@
 import yfinance as yf
 import streamlit as st
 import datetime
+import math
+import os
+import time
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+# Maximum number of points per trace sent to the browser
+MAX_PLOT_POINTS = 2000
+# Number of candles to aggregate ranges longer than MAX_PLOT_POINTS rows down to
+TARGET_CANDLES = 800
+# Line traces switch from SVG to WebGL at this many rows; shorter series stay
+# on SVG so browsers without WebGL still render small ranges
+WEBGL_MIN_POINTS = 1000
+OHLC_AGG = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Volume': 'sum'
+}
+
+# Bars dated before the current exchange session are final
+EXCHANGE_TZ = "America/New_York"
+RECENT_TTL = 600  # seconds
+# Adjusted history is rewritten by dividends and splits, so it is refetched daily
+HISTORY_TTL = 86400  # seconds
+# Upper bound on entries kept by each data and indicator cache
+CACHE_ENTRIES = 64
+
+# Local copy of the S&P 500 component table
+SP500_FILE = "sp500.pkl"
+SP500_MAX_AGE = 86400  # seconds
+
 # Page config
 st.set_page_config(
     page_title="Stock Analysis",
@@ -15,11 +46,16 @@ st.set_page_config(
 st.sidebar.header("Stock Parameters")
 
 # Get S&P 500 components
-@st.cache_data
+@st.cache_data(ttl=SP500_MAX_AGE)
 def get_sp500_components():
     try:
-        df = pd.read_html("https://en.wikipedia.org/wiki/List_of_S%26P_500_companies")
-        df = df[0]
+        if (os.path.exists(SP500_FILE)
+                and time.time() - os.path.getmtime(SP500_FILE) < SP500_MAX_AGE):
+            df = pd.read_pickle(SP500_FILE)
+        else:
+            df = pd.read_html("https://en.wikipedia.org/wiki/List_of_S%26P_500_companies")
+            df = df[0][["Symbol", "Security"]]
+            df.to_pickle(SP500_FILE)
         tickers = df["Symbol"].to_list()
         tickers_companies_dict = dict(zip(df["Symbol"], df["Security"]))
         return tickers, tickers_companies_dict
@@ -51,66 +87,6 @@ if start_date > end_date:
     st.sidebar.error("End date must be after start date")
     st.stop()
 
-# Technical Analysis Parameters
-st.sidebar.header("Technical Analysis Parameters")
-
-# Volume toggle
-volume_flag = st.sidebar.checkbox("Show Volume")
-
-# SMA
-sma_expander = st.sidebar.expander("Simple Moving Average (SMA)")
-sma_flag = sma_expander.checkbox("Add SMA")
-sma_periods = sma_expander.number_input(
-    "SMA Periods",
-    min_value=1,
-    max_value=50,
-    value=20,
-    step=1
-)
-
-# Bollinger Bands
-bb_expander = st.sidebar.expander("Bollinger Bands")
-bb_flag = bb_expander.checkbox("Add Bollinger Bands")
-bb_periods = bb_expander.number_input(
-    "BB Periods",
-    min_value=1,
-    max_value=50,
-    value=20,
-    step=1
-)
-bb_std = bb_expander.number_input(
-    "Standard Deviations",
-    min_value=1,
-    max_value=4,
-    value=2,
-    step=1
-)
-
-# RSI
-rsi_expander = st.sidebar.expander("Relative Strength Index")
-rsi_flag = rsi_expander.checkbox("Add RSI")
-rsi_periods = rsi_expander.number_input(
-    "RSI Periods",
-    min_value=1,
-    max_value=50,
-    value=14,
-    step=1
-)
-rsi_upper = rsi_expander.number_input(
-    "RSI Upper",
-    min_value=50,
-    max_value=90,
-    value=70,
-    step=1
-)
-rsi_lower = rsi_expander.number_input(
-    "RSI Lower",
-    min_value=10,
-    max_value=50,
-    value=30,
-    step=1
-)
-
 # Main app
 st.title("Stock Technical Analysis Dashboard")
 st.markdown("""
@@ -122,50 +98,113 @@ st.markdown("""
 """)
 
 # Download data
-@st.cache_data
-def load_data(symbol, start, end):
+def download(symbol, start, end):
+    data = yf.download(symbol, start, end)
+    if data.empty:
+        # Raise so that an empty result is never cached
+        raise ValueError(f"No data returned for {symbol}")
+    return data
+
+# Ranges that end before today's session
+@st.cache_data(ttl=HISTORY_TTL, max_entries=CACHE_ENTRIES, show_spinner="Downloading...")
+def download_history(symbol, start, end):
+    return download(symbol, start, end)
+
+# Ranges that include today's session; fetched whole rather than appended to
+# cached history, so adjustments never leave a step between the two
+@st.cache_data(ttl=RECENT_TTL, max_entries=CACHE_ENTRIES, show_spinner="Downloading...")
+def download_recent(symbol, start, end, version):
+    return download(symbol, start, end)
+
+def exchange_today():
+    return pd.Timestamp.now(tz=EXCHANGE_TZ).date()
+
+# Cache version for a date range: None when every bar in it is final, else a
+# clock bucket that changes every RECENT_TTL seconds. Every cache built on the
+# downloaded data takes it as an argument, so they all refresh together.
+def data_version(end):
+    # yfinance treats end as exclusive, so ranges ending by today are all history
+    if end <= exchange_today():
+        return None
+    return int(time.time() // RECENT_TTL)
+
+def load_data(symbol, start, end, version):
     try:
-        return yf.download(symbol, start, end)
+        if version is None:
+            return download_history(symbol, start, end)
+        return download_recent(symbol, start, end, version)
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return pd.DataFrame()
 
-# Technical Analysis Functions
-def calculate_sma(data, periods):
-    return data['Close'].rolling(window=periods).mean()
+# Technical Analysis Functions; cached on the close-price ndarray and parameters,
+# so results always line up with the frame the close prices came from
+@st.cache_data(max_entries=CACHE_ENTRIES)
+def calculate_sma(close, periods):
+    return pd.Series(close).rolling(window=periods).mean().to_numpy()
 
-def calculate_bollinger_bands(data, periods, std_dev):
-    sma = data['Close'].rolling(window=periods).mean()
-    std = data['Close'].rolling(window=periods).std()
+@st.cache_data(max_entries=CACHE_ENTRIES)
+def calculate_bollinger_bands(close, periods, std_dev):
+    rolling = pd.Series(close).rolling(window=periods)
+    sma = rolling.mean()
+    std = rolling.std()
     upper_band = sma + (std * std_dev)
     lower_band = sma - (std * std_dev)
-    return upper_band, lower_band
+    return upper_band.to_numpy(), lower_band.to_numpy()
 
-def calculate_rsi(data, periods):
-    delta = data['Close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=periods).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=periods).mean()
+@st.cache_data(max_entries=CACHE_ENTRIES)
+def calculate_rsi(close, periods):
+    # Wilder's smoothing: EMA with alpha = 1 / periods
+    delta = np.diff(close, prepend=np.nan)
+    gain = pd.Series(np.maximum(delta, 0)).ewm(alpha=1 / periods, adjust=False).mean()
+    loss = pd.Series(-np.minimum(delta, 0)).ewm(alpha=1 / periods, adjust=False).mean()
     rs = gain / loss
-    return 100 - (100 / (1 + rs))
+    return (100 - (100 / (1 + rs))).to_numpy()
 
-# Load data
-df = load_data(ticker, start_date, end_date)
+# Downsampling Functions
+def downsample_ohlc(data, target_bins=TARGET_CANDLES, max_rows=MAX_PLOT_POINTS):
+    if len(data) <= max_rows:
+        return data
+    # Merge every k consecutive rows, so each candle spans the same number of
+    # trading sessions (or intraday bars) regardless of weekends and holidays
+    k = math.ceil(len(data) / target_bins)
+    candles = data.groupby(np.arange(len(data)) // k).agg(OHLC_AGG)
+    candles.index = data.index[::k]
+    return candles
 
-if not df.empty:
-    # Data preview section
-    data_expander = st.expander("Preview Data")
-    with data_expander:
-        st.dataframe(df)
-        
-        # Download button
-        csv = df.to_csv().encode('utf-8')
-        st.download_button(
-            "Download Data (CSV)",
-            csv,
-            f"{ticker}_stock_data.csv",
-            "text/csv",
-            key='download-csv'
+def lttb_indices(values, max_points=MAX_PLOT_POINTS):
+    # Largest-Triangle-Three-Buckets over the non-NaN points of a series
+    valid = np.flatnonzero(~np.isnan(values))
+    n = len(valid)
+    if n <= max_points or max_points < 3:
+        return valid
+    x = valid.astype(float)
+    y = values[valid]
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    keep = np.empty(max_points, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
         )
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return valid[keep]
+
+# Figure build, cached on the data parameters and indicator flags so reruns
+# that change nothing reuse the same figure; _df is not hashed since it is
+# determined by (symbol, start, end, version). Every trace is derived from
+# _df alone, so dates, candles and indicators always come from one download.
+@st.cache_resource(max_entries=16)
+def build_fig(_df, symbol, start, end, version, title, flags):
+    (volume_flag, sma_flag, sma_periods, bb_flag, bb_periods, bb_std,
+     rsi_flag, rsi_periods, rsi_upper, rsi_lower) = flags
 
     # Create subplots
     row_heights = []
@@ -189,14 +228,22 @@ if not df.empty:
         specs=specs
     )
 
+    # Aggregate price data so only a bounded number of candles is serialized
+    candles = downsample_ohlc(_df)
+    candle_dates = candles.index.to_numpy()
+    ohlcv = candles[list(OHLC_AGG)].to_numpy(dtype=float)
+    dates = _df.index.to_numpy()
+    close = _df['Close'].to_numpy(dtype=float)
+    line_trace = go.Scattergl if len(_df) >= WEBGL_MIN_POINTS else go.Scatter
+
     # Add candlestick chart
     fig.add_trace(
         go.Candlestick(
-            x=df.index,
-            open=df['Open'],
-            high=df['High'],
-            low=df['Low'],
-            close=df['Close'],
+            x=candle_dates,
+            open=ohlcv[:, 0],
+            high=ohlcv[:, 1],
+            low=ohlcv[:, 2],
+            close=ohlcv[:, 3],
             name="OHLC"
         ),
         row=1, col=1
@@ -204,11 +251,12 @@ if not df.empty:
 
     # Add SMA
     if sma_flag:
-        sma = calculate_sma(df, sma_periods)
+        sma = calculate_sma(close, sma_periods)
+        idx = lttb_indices(sma)
         fig.add_trace(
-            go.Scatter(
-                x=df.index,
-                y=sma,
+            line_trace(
+                x=dates[idx],
+                y=sma[idx],
                 name=f"SMA ({sma_periods})",
                 line=dict(color='orange')
             ),
@@ -217,20 +265,23 @@ if not df.empty:
 
     # Add Bollinger Bands
     if bb_flag:
-        upper_bb, lower_bb = calculate_bollinger_bands(df, bb_periods, bb_std)
+        upper_bb, lower_bb = calculate_bollinger_bands(close, bb_periods, bb_std)
+        # Union of both bands' picks so each keeps its extremes and the
+        # fill still pairs points at the same dates
+        idx = np.union1d(lttb_indices(upper_bb), lttb_indices(lower_bb))
         fig.add_trace(
-            go.Scatter(
-                x=df.index,
-                y=upper_bb,
+            line_trace(
+                x=dates[idx],
+                y=upper_bb[idx],
                 name=f"Upper BB ({bb_periods}, {bb_std}σ)",
                 line=dict(color='gray', dash='dash')
             ),
             row=1, col=1
         )
         fig.add_trace(
-            go.Scatter(
-                x=df.index,
-                y=lower_bb,
+            line_trace(
+                x=dates[idx],
+                y=lower_bb[idx],
                 name=f"Lower BB ({bb_periods}, {bb_std}σ)",
                 line=dict(color='gray', dash='dash'),
                 fill='tonexty'
@@ -240,12 +291,11 @@ if not df.empty:
 
     # Add Volume
     if volume_flag:
-        colors = ['red' if row['Open'] - row['Close'] >= 0 
-                 else 'green' for index, row in df.iterrows()]
+        colors = np.where(ohlcv[:, 0] - ohlcv[:, 3] >= 0, 'red', 'green')
         fig.add_trace(
             go.Bar(
-                x=df.index,
-                y=df['Volume'],
+                x=candle_dates,
+                y=ohlcv[:, 4],
                 name="Volume",
                 marker_color=colors
             ),
@@ -254,11 +304,12 @@ if not df.empty:
 
     # Add RSI
     if rsi_flag:
-        rsi = calculate_rsi(df, rsi_periods)
+        rsi = calculate_rsi(close, rsi_periods)
+        idx = lttb_indices(rsi)
         fig.add_trace(
-            go.Scatter(
-                x=df.index,
-                y=rsi,
+            line_trace(
+                x=dates[idx],
+                y=rsi[idx],
                 name=f"RSI ({rsi_periods})",
                 line=dict(color='purple')
             ),
@@ -281,7 +332,7 @@ if not df.empty:
 
     # Update layout
     fig.update_layout(
-        title=f"{tickers_companies_dict[ticker]} ({ticker}) Stock Analysis",
+        title=title,
         yaxis_title="Price",
         xaxis_title="Date",
         height=800,
@@ -299,8 +350,104 @@ if not df.empty:
     if rsi_flag:
         fig.update_yaxes(title_text="RSI", row=3 if volume_flag else 2, col=1)
 
+    return fig
+
+# Chart section; runs as a fragment so changing an indicator only rebuilds the figure
+@st.fragment
+def render_chart(df, symbol, start, end, version, title):
+    # Technical Analysis Parameters
+    st.subheader("Technical Analysis Parameters")
+    volume_col, sma_col, bb_col, rsi_col = st.columns(4)
+
+    # Volume toggle
+    volume_flag = volume_col.checkbox("Show Volume")
+
+    # SMA
+    sma_expander = sma_col.expander("Simple Moving Average (SMA)")
+    sma_flag = sma_expander.checkbox("Add SMA")
+    sma_periods = sma_expander.number_input(
+        "SMA Periods",
+        min_value=1,
+        max_value=50,
+        value=20,
+        step=1
+    )
+
+    # Bollinger Bands
+    bb_expander = bb_col.expander("Bollinger Bands")
+    bb_flag = bb_expander.checkbox("Add Bollinger Bands")
+    bb_periods = bb_expander.number_input(
+        "BB Periods",
+        min_value=1,
+        max_value=50,
+        value=20,
+        step=1
+    )
+    bb_std = bb_expander.number_input(
+        "Standard Deviations",
+        min_value=1,
+        max_value=4,
+        value=2,
+        step=1
+    )
+
+    # RSI
+    rsi_expander = rsi_col.expander("Relative Strength Index")
+    rsi_flag = rsi_expander.checkbox("Add RSI")
+    rsi_periods = rsi_expander.number_input(
+        "RSI Periods",
+        min_value=1,
+        max_value=50,
+        value=14,
+        step=1
+    )
+    rsi_upper = rsi_expander.number_input(
+        "RSI Upper",
+        min_value=50,
+        max_value=90,
+        value=70,
+        step=1
+    )
+    rsi_lower = rsi_expander.number_input(
+        "RSI Lower",
+        min_value=10,
+        max_value=50,
+        value=30,
+        step=1
+    )
+
     # Show plot
-    st.plotly_chart(fig, use_container_width=True)
+    flags = (volume_flag, sma_flag, sma_periods, bb_flag, bb_periods, bb_std,
+             rsi_flag, rsi_periods, rsi_upper, rsi_lower)
+    st.plotly_chart(build_fig(df, symbol, start, end, version, title, flags), use_container_width=True)
+
+# Download helper
+@st.cache_data(max_entries=CACHE_ENTRIES)
+def convert_df_to_csv(symbol, start, end, version):
+    return load_data(symbol, start, end, version).to_csv().encode('utf-8')
+
+# Load data
+version = data_version(end_date)
+df = load_data(ticker, start_date, end_date, version)
+
+if not df.empty:
+    # Data preview section
+    data_expander = st.expander("Preview Data")
+    with data_expander:
+        st.dataframe(df)
+        
+        # Download button
+        csv = convert_df_to_csv(ticker, start_date, end_date, version)
+        st.download_button(
+            "Download Data (CSV)",
+            csv,
+            f"{ticker}_stock_data.csv",
+            "text/csv",
+            key='download-csv'
+        )
+
+    # Technical analysis chart
+    render_chart(df, ticker, start_date, end_date, version, f"{tickers_companies_dict[ticker]} ({ticker}) Stock Analysis")
 
 else:
     st.error("No data available for the selected stock and date range.")